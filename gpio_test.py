@@ -50,11 +50,9 @@ class SimpsonsHouseGPIOTest:
     def stepper_step(self, sequence, steps, delay=0.002):
         for _ in range(steps):
             for pattern in sequence:
-                for pin, value in zip(STEPPER_PINS, pattern):
-                    GPIO.output(pin, value)
+                GPIO.output(STEPPER_PINS, pattern)  # one call sets all four pins
                 time.sleep(delay)
-        for pin in STEPPER_PINS:
-            GPIO.output(pin, 0)
+        GPIO.output(STEPPER_PINS, 0)
 
     def test_stepper(self):
         print("🌀 Testing stepper motor")
@@ -10,10 +10,18 @@ import RPi.GPIO as GPIO
 import time
 import logging
 import json
+import os
 import signal
+import socket
 import sys
+import threading
 from datetime import datetime
 
+try:
+    import pigpio  # Optional: DMA-timed servo pulses and stepper waves via pigpiod
+except ImportError:
+    pigpio = None
+
 # ─── CONFIGURATION ─────────────────────────────────────────────────────────────
 
 # GPIO pin assignments (BCM numbering)
@@ -21,6 +29,20 @@ LIGHT_PIN = 17     # Living Room Light (LED + 220Ω resistor)
 STEPPER_PINS = [27, 18, 22, 24]  # ULN2003 IN1-IN4 for garage door stepper motor
 SERVO_PIN = 23     # Front Door Servo
 
+# Time the door servo is driven before its pulses are released (seconds)
+SERVO_SETTLE_TIME = 0.8
+
+# Phase delays shorter than this are finished with a busy-wait, after sleeping
+# until SPIN_MARGIN before the deadline (seconds). No current caller reaches it:
+# the garage runs at the default 2 ms delay. It is kept for faster moves.
+SPIN_THRESHOLD = 0.002
+SPIN_MARGIN = 0.0002
+
+# Real-time scheduling for the garage motor thread: CPU to pin it to (ideally
+# isolated with isolcpus=), and SCHED_FIFO priority. Set to None to disable.
+STEPPER_CPU = 3
+STEPPER_RT_PRIORITY = 50
+
 # Garage door travel configuration (3 full revolutions of 28BYJ-48)
 GARAGE_TRAVEL_STEPS = 100
 
@@ -28,6 +50,8 @@ GARAGE_TRAVEL_STEPS = 100
 BROKER_HOST = "localhost"
 BROKER_PORT = 1883
 KEEPALIVE   = 60
+MAX_INFLIGHT = 20  # QoS>0 messages allowed in flight before paho queues them
+SOCKET_SNDBUF = 65536  # Send buffer for the broker connection (bytes)
 
 # MQTT topics matching iOS Swift Playgrounds app
 TOPIC_LIGHT  = "home/light"
@@ -38,6 +62,9 @@ TOPIC_DOOR   = "home/door"
 TOPIC_STATUS = "home/status"
 TOPIC_SYSTEM = "home/system"
 
+# Status updates queued within this window (seconds) are merged into one publish
+STATUS_COALESCE_WINDOW = 0.02
+
 # Device states tracking (True = active/open, False = inactive/closed)
 device_states = {
     "light": False,
@@ -48,13 +75,47 @@ device_states = {
 # Garage door stepper motor state
 motor_state = {
     "running": False,
-    "position": 0,  # cumulative steps moved
+    "position": 0,  # steps from the closed position
     "last_action": "close"
 }
 
-# Global MQTT client and servo PWM object
+# Last value written by write_pin to each output pin; we own every write, so this is
+# authoritative and saves reading the pins back for diagnostics
+gpio_shadow = {}
+
+# Stepper coil levels (IN1-IN4): the last phase pattern written, so the step
+# loop records it with one store instead of updating gpio_shadow per pin.
+# Unknown (reported as null) while a pigpio wave drives the coils.
+STEPPER_OFF = (GPIO.LOW,) * len(STEPPER_PINS)
+STEPPER_UNKNOWN = (None,) * len(STEPPER_PINS)
+stepper_levels = [STEPPER_OFF]
+
+# Set to make the garage motor thread stop at the next step
+motor_stop_event = threading.Event()
+motor_thread = None
+
+# Global MQTT client, servo PWM object and pigpio connection (None if unavailable)
 client = None
 SERVO_PWM = None
+PI = None
+
+# Pending release of the servo pulses after a move
+servo_lock = threading.Lock()
+servo_release_timer = None
+
+# Device statuses waiting for the next coalesced publish
+pending_status = {}
+status_lock = threading.Lock()
+status_timer = None
+
+# Device and motor state last published as the retained home/status message
+last_retained_state = None
+
+# Last motor diagnostics payload published
+last_motor_status = {"payload": None}
+
+# Last ISO timestamp handed out and the epoch second it was formatted for
+timestamp_cache = ["", 0]
 
 # ─── LOGGING SETUP ──────────────────────────────────────────────────────────────
 
@@ -82,39 +143,75 @@ def setup_gpio():
     for pin in STEPPER_PINS:
         GPIO.setup(pin, GPIO.OUT, initial=GPIO.LOW)
     GPIO.setup(SERVO_PIN, GPIO.OUT, initial=GPIO.LOW)
+    gpio_shadow[LIGHT_PIN] = GPIO.LOW
+
+    # Prefer pigpio's DMA-timed servo pulses and stepper waveforms,
+    # fall back to software PWM at 50 Hz and Python-timed stepping
+    global SERVO_PWM, PI
+    if pigpio:
+        pi = pigpio.pi()
+        if pi.connected:
+            PI = pi
+            logger.info("⏱️  pigpio daemon connected, using hardware-timed servo and stepper")
+        else:
+            logger.warning("⚠️  pigpio daemon not running, using software servo PWM and stepping")
+    if not PI:
+        SERVO_PWM = GPIO.PWM(SERVO_PIN, 50)
+        SERVO_PWM.start(0)
 
-    # Initialize servo PWM at 50 Hz
-    global SERVO_PWM
-    SERVO_PWM = GPIO.PWM(SERVO_PIN, 50)
-    SERVO_PWM.start(0)
-
-    logger.info(f"💡 Light configured on GPIO {LIGHT_PIN}")
-    logger.info(f"🚗 Garage door stepper configured on pins: {STEPPER_PINS}")
-    logger.info(f"🚪 Door servo configured on GPIO {SERVO_PIN}")
+    logger.info("💡 Light configured on GPIO %s", LIGHT_PIN)
+    logger.info("🚗 Garage door stepper configured on pins: %s", STEPPER_PINS)
+    logger.info("🚪 Door servo configured on GPIO %s", SERVO_PIN)
 
 def set_servo_angle(angle: int) -> bool:
     """
     Move servo to specified angle (0-180 degrees).
+    The pulses are released on a timer after SERVO_SETTLE_TIME, so the MQTT
+    thread is free to handle other commands while the servo settles.
     Returns True if successful, False otherwise.
     """
+    global servo_release_timer
     try:
         if not 0 <= angle <= 180:
-            logger.error(f"Invalid servo angle: {angle}. Must be 0-180.")
+            logger.error("Invalid servo angle: %s. Must be 0-180.", angle)
             return False
-            
-        # Convert angle to duty cycle (2-12% duty cycle for 0-180 degrees)
-        duty = (angle / 180.0) * 10 + 2
-        SERVO_PWM.ChangeDutyCycle(duty)
-        time.sleep(0.8)  # Give servo time to move
-        SERVO_PWM.ChangeDutyCycle(0)  # Stop PWM to prevent jitter
+
+        with servo_lock:
+            if servo_release_timer:
+                servo_release_timer.cancel()
+
+            if PI:
+                # Convert angle to pulse width (500-2500 µs for 0-180 degrees)
+                pulse = int(500 + angle * 2000 / 180)
+                PI.set_servo_pulsewidth(SERVO_PIN, pulse)
+            else:
+                # Convert angle to duty cycle (2-12% duty cycle for 0-180 degrees)
+                duty = (angle / 180.0) * 10 + 2
+                SERVO_PWM.ChangeDutyCycle(duty)
+
+            # Give servo time to move, then stop pulses to prevent jitter
+            servo_release_timer = threading.Timer(SERVO_SETTLE_TIME, release_servo)
+            servo_release_timer.daemon = True
+            servo_release_timer.start()
         
-        logger.info(f"🚪 Door servo moved to {angle}°")
+        logger.debug("🚪 Door servo moving to %s°", angle)
         return True
         
     except Exception as e:
-        logger.error(f"❌ Servo control failed: {e}")
+        logger.error("❌ Servo control failed: %s", e)
         return False
 
+def release_servo():
+    """Stop servo pulses once the latest move has settled."""
+    with servo_lock:
+        # A newer move replaced this timer while it was waiting for the lock
+        if threading.current_thread() is not servo_release_timer:
+            return
+        if PI:
+            PI.set_servo_pulsewidth(SERVO_PIN, 0)
+        else:
+            SERVO_PWM.ChangeDutyCycle(0)
+
 STEP_SEQUENCE = [
     [1, 0, 0, 1],
     [1, 0, 0, 0],
@@ -126,57 +223,172 @@ STEP_SEQUENCE = [
     [0, 0, 0, 1]
 ]
 
-def stepper_step(sequence, steps, delay=0.002):
-    """Run the stepper motor for given steps using provided sequence."""
+PHASES_PER_STEP = len(STEP_SEQUENCE)  # 8 half-step phases per ULN2003 step cycle
+
+# Immutable forward/reverse sequences built once instead of on every rotation
+STEP_SEQUENCE_FWD = tuple(map(tuple, STEP_SEQUENCE))
+STEP_SEQUENCE_REV = tuple(reversed(STEP_SEQUENCE_FWD))
+
+# Per-phase GPIO bank bitmasks: pins driven HIGH and pins driven LOW
+SET_MASKS = tuple(
+    sum(1 << pin for pin, value in zip(STEPPER_PINS, pattern) if value)
+    for pattern in STEP_SEQUENCE_FWD
+)
+CLR_MASKS = tuple(
+    sum(1 << pin for pin, value in zip(STEPPER_PINS, pattern) if not value)
+    for pattern in STEP_SEQUENCE_FWD
+)
+SET_MASKS_REV = SET_MASKS[::-1]
+CLR_MASKS_REV = CLR_MASKS[::-1]
+
+# Stepper directions, used to index the per-direction tables below
+DIR_FWD = 0
+DIR_REV = 1
+STEP_SEQUENCES = (STEP_SEQUENCE_FWD, STEP_SEQUENCE_REV)
+PHASE_MASKS = ((SET_MASKS, CLR_MASKS), (SET_MASKS_REV, CLR_MASKS_REV))
+
+def stepper_step(sequence, steps, delay=0.002,
+                 _output=GPIO.output, _pins=STEPPER_PINS,
+                 _perf=time.perf_counter, _sleep=time.sleep,
+                 _stop=motor_stop_event, _levels=stepper_levels):
+    """
+    Run the stepper motor for given steps using provided sequence.
+    GPIO.output, the pins and the clock are bound as defaults so the hot loop
+    uses fast locals, and each phase sleeps to a deadline to avoid drift;
+    after a stall the deadline is resynced so no phases are skipped.
+    Each phase is a single list-form GPIO.output call, so the per-pin
+    register writes happen inside RPi.GPIO's C extension.
+    Delays under SPIN_THRESHOLD (none of today's callers) sleep most of the way
+    and spin on the clock for the last SPIN_MARGIN, avoiding wake-up jitter.
+    Stops early when motor_stop_event is set; returns the steps completed.
+    """
+    # Only sub-2 ms delays spin; the garage's default 2 ms delay just sleeps
+    margin = SPIN_MARGIN if delay < SPIN_THRESHOLD else 0.0
+    stopped = _stop.is_set
+    completed = 0
+    deadline = _perf()
     for _ in range(steps):
+        if stopped():
+            break
         for pattern in sequence:
-            for pin, value in zip(STEPPER_PINS, pattern):
-                GPIO.output(pin, value)
-            time.sleep(delay)
+            _output(_pins, pattern)
+            _levels[0] = pattern
+            deadline += delay
+            now = _perf()
+            if now > deadline:
+                # Over a period behind (e.g. a stall): hold this phase for a full
+                # period rather than firing the overdue phases back-to-back
+                deadline = now + delay
+            remaining = deadline - now - margin
+            if remaining > 0:
+                _sleep(remaining)
+            while _perf() < deadline:
+                pass
+        completed += 1
     stop_stepper()
+    return completed
+
+def stepper_wave(set_masks, clr_masks, steps, delay=0.002):
+    """
+    Run the stepper motor as a pigpio DMA waveform, so no Python code runs per
+    phase. The phase masks become one wave of set/clear pulses that is chained
+    `steps` times; the calling thread just waits for it or for motor_stop_event.
+    Returns the steps completed, estimated from elapsed time if stopped early.
+    """
+    if steps <= 0:
+        stop_stepper()
+        return 0
+    steps = min(steps, 0xFFFF)  # wave chain loop counts are 16-bit
+
+    delay_us = int(delay * 1_000_000)
+    pulses = [pigpio.pulse(on, off, delay_us) for on, off in zip(set_masks, clr_masks)]
+
+    PI.wave_clear()
+    PI.wave_add_generic(pulses)
+    wid = PI.wave_create()
+    try:
+        # The DMA engine changes the coils behind our back until stop_stepper
+        stepper_levels[0] = STEPPER_UNKNOWN
+        started = time.perf_counter()
+        # Loop the wave `steps` times (count given as low byte, high byte)
+        PI.wave_chain([255, 0, wid, 255, 1, steps & 0xFF, steps >> 8])
+
+        step_time = PHASES_PER_STEP * delay
+        if motor_stop_event.wait(steps * step_time):
+            PI.wave_tx_stop()
+            completed = min(steps, int((time.perf_counter() - started) / step_time))
+        else:
+            while PI.wave_tx_busy():
+                time.sleep(delay)
+            completed = steps
+    finally:
+        PI.wave_delete(wid)
+        stop_stepper()
+    return completed
 
-def rotate_stepper(direction: str, steps: int = 512):
-    """Rotate stepper motor in specified direction for steps."""
-    seq = STEP_SEQUENCE if direction == "forward" else list(reversed(STEP_SEQUENCE))
-    stepper_step(seq, steps)
-    if direction == "forward":
-        motor_state["position"] += steps
+def rotate_stepper(direction: int, steps: int = 512) -> int:
+    """Rotate stepper motor in direction (DIR_FWD/DIR_REV) for steps; returns the steps completed."""
+    if PI:
+        completed = stepper_wave(*PHASE_MASKS[direction], steps)
+    else:
+        completed = stepper_step(STEP_SEQUENCES[direction], steps)
+    if direction == DIR_FWD:
+        motor_state["position"] += completed
     else:
-        motor_state["position"] = max(0, motor_state["position"] - steps)
+        motor_state["position"] = max(0, motor_state["position"] - completed)
+    return completed
 
 def stop_stepper():
-    for pin in STEPPER_PINS:
-        GPIO.output(pin, GPIO.LOW)
+    # Always write, even if the shadow already says LOW: this is the safety path
+    GPIO.output(STEPPER_PINS, GPIO.LOW)
+    stepper_levels[0] = STEPPER_OFF
     motor_state["running"] = False
 
+def write_pin(pin: int, value: int):
+    """Write an output pin, skipping the write if it already holds that value."""
+    if gpio_shadow.get(pin) != value:
+        GPIO.output(pin, value)
+        gpio_shadow[pin] = value
+
 # ─── MQTT EVENT HANDLERS ───────────────────────────────────────────────────────
 
 def on_connect(client, userdata, flags, rc):
     """Called when MQTT client connects to broker."""
+    global last_retained_state
     if rc == 0:
         logger.info("✅ Connected to Simpson's House MQTT broker")
 
-        # Subscribe to device control topics
+        # Every (re)connect opens a new socket; disable Nagle so small status
+        # publishes are flushed immediately instead of waiting for an ACK
+        sock = client.socket()
+        if sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SNDBUF)
+
+        # Subscribe to all device control topics in a single SUBSCRIBE packet
         topics = [TOPIC_LIGHT, TOPIC_GARAGE, TOPIC_DOOR]
-        for topic in topics:
-            client.subscribe(topic)
-            logger.info(f"📡 Subscribed to: {topic}")
+        client.subscribe([(topic, 0) for topic in topics])
+        logger.info("📡 Subscribed to: %s", ", ".join(topics))
 
         # Publish initial system status
         publish_system_status("online", "Simpson's House controller with garage door stepper started")
 
+        # The broker may have lost its retained store while we were away, so
+        # the first aggregate status after every connect is retained again
+        last_retained_state = None
+
         # Publish initial device states
         for device, state in device_states.items():
             publish_device_status(device, state)
             
     else:
-        logger.error(f"❌ MQTT connection failed (code={rc})")
-        logger.error(f"   Error: {get_mqtt_error_message(rc)}")
+        logger.error("❌ MQTT connection failed (code=%s)", rc)
+        logger.error("   Error: %s", get_mqtt_error_message(rc))
 
 def on_disconnect(client, userdata, rc):
     """Called when MQTT client disconnects from broker."""
     if rc != 0:
-        logger.warning(f"⚠️  Unexpected MQTT disconnection (code={rc})")
+        logger.warning("⚠️  Unexpected MQTT disconnection (code=%s)", rc)
     else:
         logger.info("📡 MQTT disconnected cleanly")
 
@@ -187,66 +399,44 @@ def on_message(client, userdata, msg):
     """
     try:
         topic = msg.topic
-        payload = msg.payload.decode().strip().upper()
+        payload = msg.payload.decode()
 
-        logger.info(f"📨 Received command: {topic} → {payload}")
+        logger.info("📨 Received command: %s → %s", topic, payload)
 
-        success = False
-        device_name = ""
-        command_state = None
-        device_key = topic.split('/')[-1]
+        entry = DISPATCH.get(topic)
+        if entry is None:
+            logger.warning("⚠️  Unknown topic: %s", topic)
+            return
+        handler, device_key, device_name, valid_commands = entry
 
-        if topic == TOPIC_LIGHT:
-            valid_commands = {"ON": True, "OFF": False}
-            device_name = "Living Room Light"
-            command_state = valid_commands.get(payload)
-            if command_state is None:
-                logger.warning(f"⚠️  Invalid light command '{payload}'")
-                publish_error(topic, f"Invalid command: {payload}. Use ON or OFF.")
-                return
-            success = control_light(command_state)
-
-        elif topic == TOPIC_GARAGE:
-            valid_commands = {"OPEN": True, "CLOSE": False}
-            device_name = "Garage Door"
+        # The app sends exact commands; only normalize payloads that miss
+        command_state = valid_commands.get(payload)
+        if command_state is None:
+            payload = payload.strip().upper()
             command_state = valid_commands.get(payload)
-            if command_state is None:
-                logger.warning(f"⚠️  Invalid garage command '{payload}'")
-                publish_error(topic, f"Invalid command: {payload}. Use OPEN or CLOSE.")
-                return
-            success = control_garage_door(command_state)
-
-        elif topic == TOPIC_DOOR:
-            valid_commands = {"ON": True, "OFF": False}
-            device_name = "Front Door"
-            command_state = valid_commands.get(payload)
-            if command_state is None:
-                logger.warning(f"⚠️  Invalid door command '{payload}'")
-                publish_error(topic, f"Invalid command: {payload}. Use ON or OFF.")
-                return
-            success = control_door(command_state)
-
-        else:
-            logger.warning(f"⚠️  Unknown topic: {topic}")
+        if command_state is None:
+            logger.warning("⚠️  Invalid %s command '%s'", device_key, payload)
+            publish_error(topic, f"Invalid command: {payload}. Use {' or '.join(valid_commands)}.")
             return
+        success = handler(command_state)
 
-        if success and command_state is not None:
+        if success:
             device_states[device_key] = command_state
             publish_device_status(device_key, command_state)
 
-            if topic == TOPIC_GARAGE:
+            if device_key == "garage":
                 action = "OPENED" if command_state else "CLOSED"
-                logger.info(f"✅ {device_name} successfully {action}")
+                logger.info("✅ %s successfully %s", device_name, action)
             else:
                 logger.info(
-                    f"✅ {device_name} successfully turned {'ON' if command_state else 'OFF'}"
+                    "✅ %s successfully turned %s", device_name, "ON" if command_state else "OFF"
                 )
         else:
-            logger.error(f"❌ Failed to control {device_name}")
+            logger.error("❌ Failed to control %s", device_name)
             publish_error(topic, "Device control failed")
 
     except Exception as e:
-        logger.error(f"❌ Message handling error: {e}")
+        logger.error("❌ Message handling error: %s", e)
         publish_error(msg.topic, f"Processing error: {str(e)}")
 
 # ─── DEVICE CONTROL FUNCTIONS ──────────────────────────────────────────────────
@@ -255,33 +445,105 @@ def control_light(state: bool) -> bool:
     """Control the living room light (GPIO 17)."""
     try:
         gpio_state = GPIO.HIGH if state else GPIO.LOW
-        GPIO.output(LIGHT_PIN, gpio_state)
-        logger.info(f"💡 Living Room Light: {'ON' if state else 'OFF'}")
+        write_pin(LIGHT_PIN, gpio_state)
+        logger.debug("💡 Living Room Light: %s", "ON" if state else "OFF")
         return True
     except Exception as e:
-        logger.error(f"❌ Light control error: {e}")
+        logger.error("❌ Light control error: %s", e)
         return False
 
 def control_garage_door(open_door: bool) -> bool:
-    """Control the garage door stepper motor via ULN2003 driver."""
+    """
+    Control the garage door stepper motor via ULN2003 driver.
+    The motion runs on a worker thread so the MQTT thread stays responsive;
+    a new command stops any motion in progress before starting its own.
+    """
+    global motor_thread
     try:
+        halt_garage_motion()
+        motor_stop_event.clear()
         motor_state["running"] = True
 
-        if open_door:
-            logger.info("🚗 Opening garage door (forward rotation)...")
-            rotate_stepper("forward", GARAGE_TRAVEL_STEPS)
-        else:
-            logger.info("🚗 Closing garage door (reverse rotation)...")
-            rotate_stepper("reverse", GARAGE_TRAVEL_STEPS)
-
-        motor_state["running"] = False
-        motor_state["last_action"] = "open" if open_door else "close"
+        motor_thread = threading.Thread(
+            target=run_garage_door, args=(open_door,), name="garage-stepper", daemon=True
+        )
+        motor_thread.start()
         return True
     except Exception as e:
-        logger.error(f"❌ Garage door control error: {e}")
+        logger.error("❌ Garage door control error: %s", e)
         motor_state["running"] = False
         return False
 
+def tune_motor_thread():
+    """
+    Pin the calling motor thread to STEPPER_CPU and raise it to SCHED_FIFO, where
+    permitted. Returns the thread's original CPU set for restore_motor_thread.
+    """
+    try:
+        cpus = os.sched_getaffinity(0)
+    except AttributeError as e:
+        logger.debug("Real-time tuning of garage motor thread unavailable: %s", e)
+        return None
+
+    # Check the board, not the inherited mask: isolcpus= leaves the isolated
+    # CPU out of every task's default affinity, yet it can still be pinned to
+    if STEPPER_CPU is not None:
+        if STEPPER_CPU < (os.cpu_count() or 1):
+            try:
+                os.sched_setaffinity(0, {STEPPER_CPU})
+            except OSError as e:
+                logger.debug("Could not pin garage motor thread to CPU %s: %s", STEPPER_CPU, e)
+        else:
+            logger.debug("No CPU %s on this board; garage motor thread not pinned", STEPPER_CPU)
+
+    if STEPPER_RT_PRIORITY is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(STEPPER_RT_PRIORITY))
+        except OSError as e:
+            logger.debug("Could not raise garage motor thread to SCHED_FIFO: %s", e)
+    return cpus
+
+def restore_motor_thread(cpus):
+    """Return the calling motor thread to SCHED_OTHER on its original CPUs."""
+    try:
+        os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+    except (AttributeError, OSError) as e:
+        logger.debug("Could not restore garage motor thread scheduling: %s", e)
+
+def run_garage_door(open_door: bool):
+    """Drive the garage door to its open or closed position (motor thread)."""
+    cpus = tune_motor_thread()
+    try:
+        try:
+            # Only travel the remaining distance, so a reversed motion stays in range
+            if open_door:
+                logger.info("🚗 Opening garage door (forward rotation)...")
+                rotate_stepper(DIR_FWD, max(0, GARAGE_TRAVEL_STEPS - motor_state["position"]))
+            else:
+                logger.info("🚗 Closing garage door (reverse rotation)...")
+                rotate_stepper(DIR_REV, motor_state["position"])
+        finally:
+            # Leave real-time scheduling before publishing anything: threads
+            # started from here, like the status coalescing Timer, inherit it
+            restore_motor_thread(cpus)
+
+        if motor_stop_event.is_set():
+            logger.info("🛑 Garage door stopped at step %s", motor_state["position"])
+        else:
+            motor_state["last_action"] = "open" if open_door else "close"
+    except Exception as e:
+        logger.error("❌ Garage door motion error: %s", e)
+        # The command was already acknowledged; report the failure and fall
+        # back to the last position the door fully reached
+        device_states["garage"] = motor_state["last_action"] == "open"
+        publish_error(TOPIC_GARAGE, f"Garage door motion failed: {e}")
+    finally:
+        motor_state["running"] = False
+        # Refresh motor diagnostics now that the motion has finished
+        publish_device_status("garage", device_states["garage"])
+
 def control_door(state: bool) -> bool:
     """Control the front door servo (GPIO 23)."""
     try:
@@ -290,98 +552,184 @@ def control_door(state: bool) -> bool:
         success = set_servo_angle(angle)
         if success:
             action = "OPENED" if state else "CLOSED"
-            logger.info(f"🚪 Front Door: {action}")
+            logger.debug("🚪 Front Door: %s", action)
         return success
     except Exception as e:
-        logger.error(f"❌ Door control error: {e}")
+        logger.error("❌ Door control error: %s", e)
         return False
 
+# Topic → (handler, device key, display name, payload → commanded state)
+DISPATCH = {
+    TOPIC_LIGHT: (control_light, "light", "Living Room Light", {"ON": True, "OFF": False}),
+    TOPIC_GARAGE: (control_garage_door, "garage", "Garage Door", {"OPEN": True, "CLOSE": False}),
+    TOPIC_DOOR: (control_door, "door", "Front Door", {"ON": True, "OFF": False}),
+}
+
 # ─── MOTOR CONTROL UTILITY FUNCTIONS ───────────────────────────────────────────
 
 def stop_garage_emergency():
     """Emergency stop for the garage door motor - cuts power immediately."""
     try:
         logger.warning("🚨 EMERGENCY GARAGE STOP")
+        halt_garage_motion()
         stop_stepper()
     except Exception as e:
-        logger.error(f"❌ Emergency stop failed: {e}")
+        logger.error("❌ Emergency stop failed: %s", e)
+
+def halt_garage_motion():
+    """Stop any garage motion in progress and wait for the motor thread to finish."""
+    motor_stop_event.set()
+    if motor_thread and motor_thread is not threading.current_thread():
+        motor_thread.join()
 
 def get_garage_motor_status() -> dict:
     """Get current garage door stepper motor status for diagnostics."""
     return {
         "running": motor_state["running"],
         "position": motor_state["position"],
-        "gpio_states": {f"pin{idx+1}": GPIO.input(pin) for idx, pin in enumerate(STEPPER_PINS)}
+        "gpio_states": {f"pin{idx+1}": level for idx, level in enumerate(stepper_levels[0])}
     }
 
 # ─── MQTT PUBLISHING FUNCTIONS ─────────────────────────────────────────────────
 
+# Pre-encoded JSON payloads; only the changing fields are filled in per publish
+JSON_BOOL = {True: "true", False: "false"}
+STATUS_TEMPLATE = (
+    '{"timestamp": "%s", "devices": {"light": %s, "garage": %s, "door": %s}, '
+    '"garage_motor": {"running": %s, "position": %d, "last_action": "%s"}, '
+    '"controller": "online"}'
+)
+ERROR_TOPICS = {topic: f"{topic}/error" for topic in (TOPIC_LIGHT, TOPIC_GARAGE, TOPIC_DOOR)}
+SYSTEM_INFO_TEMPLATE = json.dumps({
+    "status": "__STATUS__",
+    "timestamp": "__TS__",
+    "message": "__MSG__",
+    "version": "3.2",
+    "controller": "Simpson's House GPIO Controller with Garage Door",
+    "motor_driver": "ULN2003",
+    "gpio_pins": {
+        "light": LIGHT_PIN,
+        "garage_stepper": STEPPER_PINS,
+        "servo": SERVO_PIN
+    }
+})
+
 def publish_device_status(device: str, status: bool):
-    """Publish device status update to MQTT for iOS app feedback."""
+    """
+    Queue a device status update for iOS app feedback.
+    Updates arriving within STATUS_COALESCE_WINDOW are published together.
+    """
+    global status_timer
+    with status_lock:
+        pending_status[device] = status
+        if status_timer is None:
+            status_timer = threading.Timer(STATUS_COALESCE_WINDOW, flush_device_status)
+            status_timer.daemon = True
+            status_timer.start()
+
+def flush_device_status():
+    """Publish queued device statuses followed by one merged system status."""
+    global status_timer, last_retained_state
+    with status_lock:
+        updates = pending_status.copy()
+        pending_status.clear()
+        status_timer = None
+
+    if not updates:
+        return
+
     try:
-        if device == "garage":
-            status_msg = "OPEN" if status else "CLOSED"
-        else:
-            status_msg = "ON" if status else "OFF"
-        status_topic = f"home/{device}/status"
-
-        # Publish individual device status
-        client.publish(status_topic, status_msg, retain=True)
-
-        # Include motor diagnostics for garage status
-        if device == "garage":
-            motor_status = get_garage_motor_status()
-            motor_status_topic = f"home/{device}/motor_status"
-            client.publish(motor_status_topic, json.dumps(motor_status), retain=True)
-
-        # Publish comprehensive system status
-        system_status = {
-            "timestamp": datetime.now().isoformat(),
-            "devices": device_states.copy(),
-            "garage_motor": motor_state.copy(),
-            "controller": "online"
-        }
-        client.publish(TOPIC_STATUS, json.dumps(system_status), retain=True)
-        
+        for device, status in updates.items():
+            if device == "garage":
+                status_msg = "OPEN" if status else "CLOSED"
+            else:
+                status_msg = "ON" if status else "OFF"
+            status_topic = f"home/{device}/status"
+
+            # Publish individual device status
+            client.publish(status_topic, status_msg, qos=0, retain=True)
+
+            # Include motor diagnostics for garage status
+            if device == "garage":
+                publish_motor_status()
+
+        # Publish comprehensive system status once for the whole batch
+        state = (
+            JSON_BOOL[device_states["light"]],
+            JSON_BOOL[device_states["garage"]],
+            JSON_BOOL[device_states["door"]],
+            JSON_BOOL[motor_state["running"]],
+            motor_state["position"],
+            motor_state["last_action"],
+        )
+        system_status = STATUS_TEMPLATE % (now_iso(), *state)
+
+        # Only store a new retained copy when the state actually changed;
+        # repeats (e.g. on reconnect) go out as plain messages
+        changed = state != last_retained_state
+        client.publish(TOPIC_STATUS, system_status, qos=0, retain=changed)
+        if changed:
+            last_retained_state = state
+
     except Exception as e:
-        logger.error(f"❌ Status publishing error: {e}")
+        logger.error("❌ Status publishing error: %s", e)
+
+def publish_motor_status():
+    """
+    Publish garage motor diagnostics, only when they changed. Not retained: it
+    is diagnostic data, and the retained home/status already carries the state.
+    """
+    payload = json.dumps(get_garage_motor_status())
+    if payload == last_motor_status["payload"]:
+        return
+    client.publish("home/garage/motor_status", payload, qos=0, retain=False)
+    last_motor_status["payload"] = payload
 
 def publish_system_status(status: str, message: str = ""):
     """Publish overall system status."""
     try:
-        system_info = {
-            "status": status,
-            "timestamp": datetime.now().isoformat(),
-            "message": message,
-            "version": "3.2",
-            "controller": "Simpson's House GPIO Controller with Garage Door",
-            "motor_driver": "ULN2003",
-            "gpio_pins": {
-                "light": LIGHT_PIN,
-                "garage_stepper": STEPPER_PINS,
-                "servo": SERVO_PIN
-            }
-        }
-        client.publish(TOPIC_SYSTEM, json.dumps(system_info), retain=True)
+        system_info = (
+            SYSTEM_INFO_TEMPLATE
+            .replace('"__STATUS__"', json.dumps(status), 1)
+            .replace('"__TS__"', json.dumps(now_iso()), 1)
+            .replace('"__MSG__"', json.dumps(message), 1)
+        )
+        client.publish(TOPIC_SYSTEM, system_info, qos=0, retain=True)
     except Exception as e:
-        logger.error(f"❌ System status publishing error: {e}")
+        logger.error("❌ System status publishing error: %s", e)
 
 def publish_error(topic: str, error_msg: str):
-    """Publish error message for iOS app debugging."""
+    """
+    Publish error message for iOS app debugging.
+    Motor diagnostics are only attached at DEBUG level, so a client sending
+    bad payloads cannot make every error report carry them.
+    """
     try:
-        error_topic = f"{topic}/error"
+        error_topic = ERROR_TOPICS.get(topic) or f"{topic}/error"
+        include_motor = topic == TOPIC_GARAGE and logger.isEnabledFor(logging.DEBUG)
         error_info = {
             "error": error_msg,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso(),
             "topic": topic,
-            "motor_status": get_garage_motor_status() if "garage" in topic else None
+            "motor_status": get_garage_motor_status() if include_motor else None
         }
-        client.publish(error_topic, json.dumps(error_info))
+        client.publish(error_topic, json.dumps(error_info), qos=0)
     except Exception as e:
-        logger.error(f"❌ Error publishing failed: {e}")
+        logger.error("❌ Error publishing failed: %s", e)
 
 # ─── UTILITY FUNCTIONS ─────────────────────────────────────────────────────────
 
+def now_iso() -> str:
+    """
+    Return the current local time in ISO format with microseconds.
+    The date and time part is formatted once per second and reused.
+    """
+    now = time.time()
+    second = int(now)
+    if second != timestamp_cache[1]:
+        timestamp_cache[:] = [datetime.fromtimestamp(second).isoformat(), second]
+    return f"{timestamp_cache[0]}.{int((now - second) * 1_000_000):06d}"
+
 def get_mqtt_error_message(rc: int) -> str:
     """Convert MQTT return code to human-readable message."""
     error_messages = {
@@ -397,12 +745,18 @@ def get_mqtt_error_message(rc: int) -> str:
 
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully."""
-    logger.info(f"🛑 Received signal {signum}, shutting down Simpson's House...")
+    logger.info("🛑 Received signal %s, shutting down Simpson's House...", signum)
     cleanup_and_exit()
 
 def cleanup_and_exit():
     """Perform clean shutdown of all systems."""
     logger.info("🧹 Cleaning up Simpson's House systems...")
+
+    # Send any status updates still waiting in the coalesce window
+    if status_timer:
+        status_timer.cancel()
+    if client and client.is_connected():
+        flush_device_status()
     
     try:
         # Emergency stop garage door first
@@ -412,16 +766,22 @@ def cleanup_and_exit():
         # Turn off all devices safely
         logger.info("🔌 Turning off all devices...")
         GPIO.output(LIGHT_PIN, GPIO.LOW)
+        gpio_shadow[LIGHT_PIN] = GPIO.LOW
         stop_stepper()
 
         # Stop PWM and cleanup GPIO
+        if servo_release_timer:
+            servo_release_timer.cancel()
         if SERVO_PWM:
             SERVO_PWM.stop()
+        if PI:
+            PI.set_servo_pulsewidth(SERVO_PIN, 0)
+            PI.stop()
         GPIO.cleanup()
         logger.info("✅ GPIO cleaned up successfully")
         
     except Exception as e:
-        logger.error(f"❌ GPIO cleanup error: {e}")
+        logger.error("❌ GPIO cleanup error: %s", e)
     
     try:
         # Publish offline status
@@ -429,9 +789,11 @@ def cleanup_and_exit():
             publish_system_status("offline", "Controller shutting down")
             client.disconnect()
             logger.info("📡 MQTT disconnected")
+        if client:
+            client.loop_stop()
             
     except Exception as e:
-        logger.error(f"❌ MQTT cleanup error: {e}")
+        logger.error("❌ MQTT cleanup error: %s", e)
     
     logger.info("👋 Simpson's House controller stopped. Goodbye!")
     sys.exit(0)
@@ -459,29 +821,35 @@ def main():
         client.on_connect = on_connect
         client.on_disconnect = on_disconnect
         client.on_message = on_message
+        client.max_inflight_messages_set(MAX_INFLIGHT)
+        client.max_queued_messages_set(0)  # never drop queued publishes
         
         # Set last will message (published if connection lost unexpectedly)
         client.will_set(TOPIC_SYSTEM, json.dumps({
             "status": "offline",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now_iso(),
             "reason": "unexpected_disconnect",
             "garage_emergency_stopped": True
-        }), retain=True)
+        }), qos=0, retain=True)
         
         # Connect to MQTT broker
-        logger.info(f"📡 Connecting to MQTT broker at {BROKER_HOST}:{BROKER_PORT}")
+        logger.info("📡 Connecting to MQTT broker at %s:%s", BROKER_HOST, BROKER_PORT)
         client.connect(BROKER_HOST, BROKER_PORT, KEEPALIVE)
         
-        # Start MQTT message loop
+        # Run the MQTT network loop on paho's background thread
         logger.info("🎮 Simpson's House garage door control ready!")
         logger.info("📱 Connect your iPhone/iPad and start controlling the house!")
         logger.info("🚗 Garage door commands: OPEN=Forward rotation, CLOSE=Reverse rotation")
-        client.loop_forever()
+        client.loop_start()
+
+        # Main thread only waits for shutdown signals
+        while True:
+            signal.pause()
         
     except KeyboardInterrupt:
         logger.info("⌨️  Interrupted by user")
     except Exception as e:
-        logger.error(f"❌ Fatal error: {e}")
+        logger.error("❌ Fatal error: %s", e)
         logger.error("💥 Simpson's House controller crashed!")
         # Emergency stop garage door on crash
         try:
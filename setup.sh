@@ -262,7 +262,7 @@ setup_python_env() {
     log "Virtual environment Python: $venv_python_version"
     
     run_cmd "pip install --upgrade pip setuptools wheel" "Upgrading pip and setuptools"
-    run_cmd "pip install paho-mqtt RPi.GPIO" "Installing Python packages"
+    run_cmd "pip install paho-mqtt RPi.GPIO pigpio" "Installing Python packages"
     
     # Verify Python packages
     step "Verifying Python package installations..."
@@ -403,6 +403,8 @@ WorkingDirectory=$SCRIPT_DIR
 ExecStart=$SCRIPT_DIR/mqttenv/bin/python $SCRIPT_DIR/mqttlistener.py
 Restart=always
 RestartSec=10
+# Allow the garage motor thread to use SCHED_FIFO without running as root
+AmbientCapabilities=CAP_SYS_NICE
 StandardOutput=journal
 StandardError=journal
 
@@ -5,52 +5,127 @@ Verifies basic operation of a 28BYJ-48 stepper motor using ULN2003 driver.
 """
 
 import RPi.GPIO as GPIO
+import functools
+import os
 import time
+from itertools import chain, repeat
+
+try:
+    import pigpio  # Optional: DMA-timed stepping via the pigpiod daemon
+except ImportError:
+    pigpio = None
 
 STEPPER_PINS = [27, 18, 22, 24]  # IN1-IN4
 
-STEP_SEQUENCE = [
-    [1,0,0,1],
-    [1,0,0,0],
-    [1,1,0,0],
-    [0,1,0,0],
-    [0,1,1,0],
-    [0,0,1,0],
-    [0,0,1,1],
-    [0,0,0,1]
-]
+STEP_SEQUENCE = (
+    (1,0,0,1),
+    (1,0,0,0),
+    (1,1,0,0),
+    (0,1,0,0),
+    (0,1,1,0),
+    (0,0,1,0),
+    (0,0,1,1),
+    (0,0,0,1)
+)
+STEP_SEQUENCE_REV = STEP_SEQUENCE[::-1]
+
+SPIN_MARGIN = 0.0002  # busy-wait the last 200 µs of each phase for steady timing
+
+STEPPER_CPU = 3           # core to run on (isolate it with isolcpus=3 for best results)
+STEPPER_RT_PRIORITY = 80  # SCHED_FIFO priority, needs root or CAP_SYS_NICE
 
 def setup():
     GPIO.setmode(GPIO.BCM)
     GPIO.setwarnings(False)
-    for pin in STEPPER_PINS:
-        GPIO.setup(pin, GPIO.OUT)
-        GPIO.output(pin, 0)
+    GPIO.setup(STEPPER_PINS, GPIO.OUT, initial=0)
+
+def set_realtime():
+    """Pin the test to STEPPER_CPU and switch to SCHED_FIFO where permitted."""
+    # Check the board, not our affinity mask: isolcpus= leaves the isolated
+    # CPU out of the default mask, but we can still pin to it
+    if STEPPER_CPU < (os.cpu_count() or 1):
+        try:
+            os.sched_setaffinity(0, {STEPPER_CPU})
+            print(f"📌 Pinned to CPU {STEPPER_CPU}")
+        except (AttributeError, OSError) as e:
+            print(f"⚠️  Could not pin to CPU {STEPPER_CPU} ({e})")
+    else:
+        print(f"⚠️  No CPU {STEPPER_CPU} on this board; not pinning")
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(STEPPER_RT_PRIORITY))
+        print("⏱️  Real-time scheduling enabled")
+    except (AttributeError, OSError) as e:
+        print(f"⚠️  Real-time scheduling unavailable ({e}); timing may jitter")
 
 def step(sequence, delay, steps):
-    for _ in range(steps):
-        for pattern in sequence:
-            for pin, value in zip(STEPPER_PINS, pattern):
-                GPIO.output(pin, value)
-            time.sleep(delay)
-    for pin in STEPPER_PINS:
-        GPIO.output(pin, 0)
+    out = GPIO.output
+    pins = STEPPER_PINS
+    clock = time.perf_counter
+    next_t = clock()
+    # One flat pass over every phase of every step, without materializing a list
+    for pattern in chain.from_iterable(repeat(sequence, steps)):
+        out(pins, pattern)  # one call sets all four pins
+        next_t += delay
+        now = clock()
+        if now > next_t:
+            # Over a period behind: resync instead of bursting the overdue phases
+            next_t = now + delay
+        remaining = next_t - now - SPIN_MARGIN
+        if remaining > 0:
+            time.sleep(remaining)
+        while clock() < next_t:
+            pass
+    GPIO.output(STEPPER_PINS, 0)
+
+def wave_step(pi, sequence, delay, steps):
+    """Play the sequence `steps` times as a pigpio DMA waveform, like the listener does."""
+    delay_us = int(delay * 1_000_000)
+    pulses = []
+    for pattern in sequence:
+        set_mask = sum(1 << pin for pin, value in zip(STEPPER_PINS, pattern) if value)
+        clr_mask = sum(1 << pin for pin, value in zip(STEPPER_PINS, pattern) if not value)
+        pulses.append(pigpio.pulse(set_mask, clr_mask, delay_us))
+
+    pi.wave_clear()
+    pi.wave_add_generic(pulses)
+    wid = pi.wave_create()
+    try:
+        # Loop the wave `steps` times (count given as low byte, high byte)
+        pi.wave_chain([255, 0, wid, 255, 1, steps & 0xFF, steps >> 8])
+        while pi.wave_tx_busy():
+            time.sleep(0.01)
+    finally:
+        pi.wave_tx_stop()
+        pi.wave_delete(wid)
+    GPIO.output(STEPPER_PINS, 0)
 
 def main():
     print("🌀 Stepper Motor Test for Simpson's House")
     setup()
+
+    pi = pigpio.pi() if pigpio else None
+    if pi and pi.connected:
+        print("⏱️  pigpio daemon connected, stepping with DMA waveforms")
+        run = functools.partial(wave_step, pi)
+    else:
+        pi = None
+        set_realtime()
+        run = step
+
     try:
         print("Rotating forward one revolution...")
-        step(STEP_SEQUENCE, 0.002, 512)
+        run(STEP_SEQUENCE, 0.002, 512)
         print("Rotating reverse one revolution...")
-        step(list(reversed(STEP_SEQUENCE)), 0.002, 512)
+        run(STEP_SEQUENCE_REV, 0.002, 512)
         print("✅ Stepper motor test complete")
     except KeyboardInterrupt:
         pass
     finally:
-        for pin in STEPPER_PINS:
-            GPIO.output(pin, 0)
-        GPIO.cleanup()
+        if pi:
+            pi.wave_tx_stop()
+            pi.stop()
+        GPIO.output(STEPPER_PINS, 0)
+        GPIO.cleanup(STEPPER_PINS)
 
 if __name__ == "__main__":
     main()